@@ -1,14 +1,422 @@
+import hashlib
+import json
 import os
+import shutil
 import subprocess
+import time
+import urllib.error
 import urllib.request
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sys
 
+try:
+    # ISA-L's inflate is a drop-in for zlib and considerably faster. zipfile
+    # looks up zlib.decompressobj (and compressobj) at call time, so swapping
+    # the module is enough for those; crc32 was bound at import and stays stdlib.
+    import isal.isal_zlib as _isal_zlib
+    zipfile.zlib = _isal_zlib
+except ImportError:
+    pass
+
 PROJECT_DIR = Path(__file__).resolve().parent
 BENTO4_DIR = PROJECT_DIR / "bento4"
 WRAPPER_DIR = PROJECT_DIR / "wrapper"
 AMD_DIR = PROJECT_DIR / "apple-music-downloader"
+DEBUG = os.environ.get("ALAC_RIP_DEBUG")
+
+APT_PACKAGES = ["git", "ffmpeg", "gpac", "golang-go", "wget", "python3-flask", "python3-yaml", "gunicorn"]
+APT_UPDATE_STAMP = PROJECT_DIR / ".apt-updated"
+APT_UPDATE_MAX_AGE = 24 * 60 * 60  # seconds
+
+def _load_meta(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+def _parse_content_range(value):
+    """Return (start, total) from a ``Content-Range`` header.
+
+    Either item is None when missing or unknown, e.g. ``bytes */1234`` or
+    ``bytes 0-99/*``.
+    """
+    unit, _, rest = (value or "").strip().partition(" ")
+    if unit != "bytes":
+        return None, None
+    span, _, total = rest.partition("/")
+    start = span.partition("-")[0].strip()
+    total = total.strip()
+    return (int(start) if start.isdigit() else None,
+            int(total) if total.isdigit() else None)
+
+def _restart_download(url, dest, chunk, part, part_meta_path):
+    part.unlink(missing_ok=True)
+    part_meta_path.unlink(missing_ok=True)
+    return _download(url, dest, chunk)
+
+def _download(url, dest, chunk=1 << 20):
+    """Stream url to dest in chunk-sized blocks, revalidating any cached copy.
+
+    The response validators and SHA-256 of the body are kept in a
+    ``<dest>.meta`` sidecar, so an unchanged artifact comes back as a 304 and
+    nothing is transferred. Bytes land in ``<dest>.part`` first and are moved
+    into place only once complete; an interrupted transfer is resumed from
+    there on the next run. Returns the SHA-256 of dest.
+    """
+    dest = Path(dest)
+    meta_path = dest.with_name(dest.name + ".meta")
+    part = dest.with_name(dest.name + ".part")
+    part_meta_path = dest.with_name(dest.name + ".part.meta")
+
+    meta = _load_meta(meta_path) if dest.exists() else {}
+    # A truncated or replaced file can't be trusted as a cache
+    if meta.get("content_length") and int(meta["content_length"]) != dest.stat().st_size:
+        meta = {}
+
+    req = urllib.request.Request(url)
+    offset = part.stat().st_size if part.exists() else 0
+    part_meta = _load_meta(part_meta_path) if offset else {}
+    validator = part_meta.get("etag") or part_meta.get("last_modified")
+    if validator:
+        # Resume, but only if the server still has the same artifact
+        req.add_header("Range", f"bytes={offset}-")
+        req.add_header("If-Range", validator)
+    else:
+        offset = 0
+        if meta.get("etag"):
+            req.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            req.add_header("If-Modified-Since", meta["last_modified"])
+
+    try:
+        resp = urllib.request.urlopen(req, timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and meta.get("sha256"):
+            print(f"INFO: {dest.name} not modified, using cached copy")
+            return meta["sha256"]
+        if e.code == 416 and validator:
+            _, total = _parse_content_range(e.headers.get("Content-Range"))
+            if total == offset:
+                # The transfer finished but was never moved into place
+                print(f"INFO: {dest.name} already fully downloaded, finishing up")
+                digest = hashlib.sha256()
+                with open(part, "rb") as f:
+                    while buf := f.read(chunk):
+                        digest.update(buf)
+                return _finish_download(part, dest, digest, part_meta, total)
+            # The partial file no longer lines up with the server; start over
+            return _restart_download(url, dest, chunk, part, part_meta_path)
+        raise
+
+    digest = hashlib.sha256()
+    if resp.status == 206:
+        start, total = _parse_content_range(resp.headers.get("Content-Range"))
+        if start != offset or total is None:
+            # Appending anything but the exact continuation would corrupt the
+            # file and poison the cached digest
+            resp.close()
+            if not validator:
+                # We never asked for a range, so retrying wouldn't help
+                raise urllib.error.URLError(f"unexpected partial response for {url}")
+            print(f"WARN: Unexpected range for {dest.name}, restarting download")
+            return _restart_download(url, dest, chunk, part, part_meta_path)
+        print(f"INFO: Resuming {dest.name} from byte {offset}")
+        with open(part, "rb") as f:
+            while buf := f.read(chunk):
+                digest.update(buf)
+        mode = "ab"
+    else:
+        part_meta = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
+        part_meta_path.write_text(json.dumps(part_meta))
+        total = resp.headers.get("Content-Length")
+        mode = "wb"
+
+    # Same shape as shutil.copyfileobj, but hashing in the same pass saves
+    # re-reading the archive for the cache manifest
+    with resp, open(part, mode) as f:
+        while buf := resp.read(chunk):
+            f.write(buf)
+            digest.update(buf)
+
+    return _finish_download(part, dest, digest, part_meta, total)
+
+def _finish_download(part, dest, digest, part_meta, total):
+    """Move a complete .part file into place and record its cache metadata."""
+    # read() returns b"" when the connection drops early instead of raising,
+    # so check the size here. Leaving .part and .part.meta lets the next run resume.
+    size = part.stat().st_size
+    if total and size != int(total):
+        raise urllib.error.URLError(
+            f"incomplete download of {dest.name}: got {size} of {total} bytes"
+        )
+    os.replace(part, dest)
+    meta = {
+        **part_meta,
+        "content_length": str(total) if total else None,
+        "sha256": digest.hexdigest(),
+    }
+    dest.with_name(dest.name + ".meta").write_text(json.dumps(meta))
+    dest.with_name(dest.name + ".part.meta").unlink(missing_ok=True)
+    return meta["sha256"]
+
+def _open_sequential(path):
+    """Open path for reading and hint the kernel to read ahead aggressively."""
+    f = open(path, "rb")
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return f
+
+def _extract_members(zip_path, dest, members):
+    with _open_sequential(zip_path) as f, zipfile.ZipFile(f, "r") as zip_ref:
+        for info in members:
+            path = zip_ref.extract(info, dest)
+            # zipfile drops permissions; restore the Unix mode from the
+            # central directory so executables arrive with their x bits
+            mode = (info.external_attr >> 16) & 0o777  # never setuid/setgid/sticky
+            if mode:
+                os.chmod(path, mode)
+
+def extract_parallel(zip_path, dest, workers=4):
+    """Extract zip_path into dest, inflating members across worker threads."""
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        infos = zip_ref.infolist()
+
+    # Create the directory tree up front so workers never race on makedirs
+    dest = Path(dest).resolve()
+    files = []
+    for info in infos:
+        target = (dest / info.filename).resolve()
+        if target != dest and dest not in target.parents:
+            continue  # never create anything outside dest
+        if info.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            files.append(info)
+
+    # Zip entries are compressed independently and zlib releases the GIL while
+    # inflating, so each worker opens its own handle and takes a contiguous
+    # run of members, which keeps its reads sequential through the archive.
+    files.sort(key=lambda info: info.header_offset)
+    size = max(1, -(-len(files) // workers))
+    chunks = [files[i:i + size] for i in range(0, len(files), size)]
+    with ThreadPoolExecutor(max_workers=max(len(chunks), 1)) as ex:
+        list(ex.map(lambda members: _extract_members(zip_path, dest, members), chunks))
+
+    if hasattr(os, "posix_fadvise"):
+        # Nothing reads the archive again this run, so release its page cache
+        fd = os.open(zip_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def _stage_archive(zip_path, dest):
+    """Extract zip_path into a fresh staging directory next to dest."""
+    staging = dest.with_name(dest.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    extract_parallel(zip_path, staging)
+    return staging
+
+def _commit_staged(staging, dest, digest):
+    # Write the manifest before the swap so dest only ever appears complete;
+    # a dest without a manifest can then only be an older finished install
+    (staging / ".sha256").write_text(digest)
+    # Move any previous install aside rather than deleting it in place, so the
+    # swap itself is two renames and a failed cleanup can't block it
+    old = dest.with_name(dest.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if dest.exists():
+        os.replace(dest, old)
+    os.replace(staging, dest)
+    if old.exists():
+        shutil.rmtree(old)
+
+def fetch_bento4():
+    BENTO4_URL = "https://www.bok.net/Bento4/binaries/Bento4-SDK-1-6-0-641.x86_64-unknown-linux.zip"
+    zip_path = PROJECT_DIR / "bento4.zip"
+    manifest = BENTO4_DIR / ".sha256"
+
+    if BENTO4_DIR.exists() and not manifest.exists():
+        print("INFO: Bento4 already exists, skipping download")
+        return
+
+    print(f"Downloading Bento4 from {BENTO4_URL}...")
+    digest = _download(BENTO4_URL, zip_path)
+
+    if manifest.exists() and manifest.read_text().strip() == digest:
+        print("INFO: Bento4 already up to date, skipping extraction")
+        return
+
+    print("Extracting Bento4...")
+    staging = _stage_archive(zip_path, BENTO4_DIR)
+    _commit_staged(staging, BENTO4_DIR, digest)
+
+    print("Bento4 installed inside project folder.")
+
+def fetch_wrapper():
+    WRAPPER_URL = "https://github.com/WorldObservationLog/wrapper/releases/download/Wrapper.x86_64.0df45b5/Wrapper.x86_64.0df45b5.zip"
+    wrapper_zip = PROJECT_DIR / "wrapper.x86_64.zip"
+    manifest = WRAPPER_DIR / ".sha256"
+
+    if WRAPPER_DIR.exists() and not manifest.exists():
+        print("INFO: Wrapper already exists, skipping download")
+        return
+
+    print(f"Downloading wrapper from {WRAPPER_URL}...")
+    digest = _download(WRAPPER_URL, wrapper_zip)
+
+    if manifest.exists() and manifest.read_text().strip() == digest:
+        print("INFO: Wrapper already up to date, skipping extraction")
+        return
+
+    print("Extracting wrapper...")
+    staging = _stage_archive(wrapper_zip, WRAPPER_DIR)
+
+    # Ensure the wrapper binary is executable (running as root, so no sudo needed)
+    wrapper_bin = staging / "wrapper"
+    try:
+        if wrapper_bin.exists():
+            current_mode = wrapper_bin.stat().st_mode
+            if current_mode & 0o755 != 0o755:
+                wrapper_bin.chmod(current_mode | 0o755)
+                print("Set execute permission on wrapper binary")
+        else:
+            print("WARN: Wrapper binary not found after extraction")
+    except Exception as e:
+        print(f"WARN: Failed to chmod wrapper binary: {e}")
+
+    _commit_staged(staging, WRAPPER_DIR, digest)
+    print("Wrapper extracted inside project folder")
+
+def clone_amd():
+    if not AMD_DIR.exists():
+        print("Cloning Apple Music Downloader...")
+        # Only the working tree is needed, so skip history and lazily fetch blobs
+        clone_args = ["git", "clone", "--depth=1", "--single-branch"]
+        repo_args = ["https://github.com/zhaarey/apple-music-downloader", str(AMD_DIR)]
+        result = subprocess.run([*clone_args, "--filter=blob:none", *repo_args])
+        if result.returncode != 0:
+            # Older git or servers without partial-clone support
+            print("WARN: Partial clone failed, retrying without --filter")
+            subprocess.run([*clone_args, *repo_args], check=True)
+        print("Apple Music Downloader cloned inside project folder")
+    else:
+        print("INFO: Apple Music Downloader already exists, skipping clone")
+
+def find_bento4_bin():
+    bin_candidates = list(BENTO4_DIR.glob("Bento4*"))  # find extracted folder
+    if bin_candidates:
+        return bin_candidates[0] / "bin"
+    return None
+
+def link_bento4():
+    # Create symbolic links to Bento4 tools in /usr/local/bin; returns the bin dir
+    bin_dir = find_bento4_bin()
+    if bin_dir is None:
+        print("WARN: Could not find Bento4 extracted folder")
+        return None
+
+    if DEBUG:
+        print(f"DEBUG: Creating symbolic links for Bento4 tools from: {bin_dir}")
+
+    if not bin_dir.exists():
+        print(f"ERROR: Bin directory does not exist: {bin_dir}")
+        return None
+
+    # Make sure every tool is executable. extract_parallel() restores archived modes,
+    # so this only issues a chmod for files the archive didn't mark executable.
+    # A single scandir pass reuses each DirEntry's cached stat instead of re-probing.
+    print("Setting execute permissions on all Bento4 tools...")
+    executable_files = []
+    failures = []
+    with os.scandir(bin_dir) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                # Add execute permission for owner, group, and others
+                mode = entry.stat(follow_symlinks=False).st_mode
+                if mode & 0o755 != 0o755:
+                    os.chmod(entry.path, mode | 0o755)  # rwxr-xr-x
+                executable_files.append(Path(entry.path))
+            except Exception as e:
+                failures.append(f"  ERROR: Failed to set execute permission on {entry.name}: {e}")
+
+    # Report once after the loop rather than flushing a line per file
+    if failures:
+        print("\n".join(failures))
+    if DEBUG:
+        print(f"DEBUG: Executable files after chmod: {[f.name for f in executable_files]}")
+
+    # Add to current session PATH as well
+    os.environ["PATH"] = f"{bin_dir}:{os.environ['PATH']}"
+
+    # Create all symbolic links with a single `ln` call; -f replaces stale links
+    if executable_files:
+        result = subprocess.run(
+            ["ln", "-sf", "-t", "/usr/local/bin/", *(str(f.absolute()) for f in executable_files)],
+            capture_output=True, text=True
+        )
+        if result.returncode == 0:
+            print(f"SUMMARY: {len(executable_files)} symlinks created in /usr/local/bin")
+        else:
+            print(f"ERROR: Failed to create some symlinks: {result.stderr.strip()}")
+    else:
+        print("SUMMARY: No Bento4 tools to link")
+
+    # Verify what actually got created
+    if DEBUG:
+        usr_local_bin = Path("/usr/local/bin")
+        names = {exe.name for exe in executable_files}
+        verified = [
+            f"  VERIFIED: {link.name} -> {link.readlink()}"
+            for link in usr_local_bin.glob("*")
+            if link.name in names and link.is_symlink()
+        ]
+        print(f"DEBUG: Found {len(verified)} Bento4 symlinks in /usr/local/bin")
+        if verified:
+            print("\n".join(verified))
+
+    return bin_dir
+
+def install_packages():
+    # One dpkg-query for all packages; anything unknown to dpkg is simply absent
+    # from the output and therefore counts as missing
+    result = subprocess.run(
+        ["dpkg-query", "-W", "-f=${Package}\t${Status}\n", *APT_PACKAGES],
+        capture_output=True, text=True
+    )
+    installed = {
+        name for name, _, status in (line.partition("\t") for line in result.stdout.splitlines())
+        if status == "install ok installed"
+    }
+    missing = [pkg for pkg in APT_PACKAGES if pkg not in installed]
+    if not missing:
+        print("INFO: All required packages already installed, skipping apt")
+        return
+
+    # apt-fast wraps apt-get with parallel downloads when it is installed
+    apt = shutil.which("apt-fast") or "apt-get"
+
+    # Only refresh package lists when our last successful update is stale, so
+    # repeated setups don't hit the mirrors again
+    try:
+        update_age = time.time() - APT_UPDATE_STAMP.stat().st_mtime
+    except OSError:
+        update_age = None
+    if update_age is None or update_age > APT_UPDATE_MAX_AGE:
+        subprocess.run([apt, "update"], check=True)
+        APT_UPDATE_STAMP.touch()
+
+    subprocess.run([apt, "install", "-y", *missing], check=True)
 
 def firstsetup():
     # --- Check for root ---
@@ -18,199 +426,63 @@ def firstsetup():
 
     try:
         # Step 1: Install required packages
-        subprocess.run(
-            ["apt-get", "install", "-y", "git", "ffmpeg", "gpac", "golang-go", "wget","python3-flask","python3-yaml"],
-            check=True
-        )
+        install_packages()
         print("Packages installed successfully.")
 
-        # Step 2: Download and set up Bento4
-        BENTO4_URL = "https://www.bok.net/Bento4/binaries/Bento4-SDK-1-6-0-641.x86_64-unknown-linux.zip"
-        zip_path = PROJECT_DIR / "bento4.zip"
-
-        if not BENTO4_DIR.exists():
-            print(f"Downloading Bento4 from {BENTO4_URL}...")
-            urllib.request.urlretrieve(BENTO4_URL, zip_path)
-            print("Extracting Bento4...")
-
-            BENTO4_DIR.mkdir(parents=True, exist_ok=True)
-            with zipfile.ZipFile(zip_path, "r") as zip_ref:
-                zip_ref.extractall(BENTO4_DIR)
-            os.remove(zip_path)
-
-            print("Bento4 installed inside project folder.")
-            
-            # Create symbolic links to Bento4 tools in /usr/local/bin
-            bin_candidates = list(BENTO4_DIR.glob("Bento4*"))
-            if bin_candidates:
-                bin_dir = bin_candidates[0] / "bin"
-                print(f"DEBUG: Creating symbolic links for Bento4 tools from: {bin_dir}")
-                print(f"DEBUG: Bin directory exists: {bin_dir.exists()}")
-                
-                if not bin_dir.exists():
-                    print(f"ERROR: Bin directory does not exist: {bin_dir}")
-                    return
-                
-                # List all files for debugging
-                all_files = list(bin_dir.glob("*"))
-                print(f"DEBUG: All files in bin: {[f.name for f in all_files]}")
-                
-                # First, make all files executable (ZIP extraction doesn't preserve execute permissions)
-                print("Setting execute permissions on all Bento4 tools...")
-                for exe_file in all_files:
-                    if exe_file.is_file():
-                        try:
-                            # Add execute permission for owner, group, and others
-                            current_mode = exe_file.stat().st_mode
-                            new_mode = current_mode | 0o755  # rwxr-xr-x
-                            exe_file.chmod(new_mode)
-                            print(f"  CHMOD: Set execute permission on {exe_file.name}")
-                        except Exception as e:
-                            print(f"  ERROR: Failed to set execute permission on {exe_file.name}: {e}")
-                
-                # Now check for executable files again
-                executable_files = [f for f in all_files if f.is_file() and os.access(f, os.X_OK)]
-                print(f"DEBUG: Executable files after chmod: {[f.name for f in executable_files]}")
-                
-                # Add to current session PATH as well
-                os.environ["PATH"] = f"{bin_dir}:{os.environ['PATH']}"
-                
-                # Create symbolic links with detailed error reporting
-                success_count = 0
-                error_count = 0
-                
-                for exe_file in executable_files:
-                    try:
-                        link_path = Path("/usr/local/bin") / exe_file.name
-                        print(f"DEBUG: Attempting to create symlink: {exe_file.name}")
-                        print(f"DEBUG: Source: {exe_file.absolute()}")
-                        print(f"DEBUG: Target: {link_path}")
-                        
-                        if link_path.exists():
-                            print(f"  INFO: Already exists: {exe_file.name}")
-                        else:
-                            os.symlink(str(exe_file.absolute()), str(link_path))
-                            print(f"  SUCCESS: Created symlink for {exe_file.name}")
-                            success_count += 1
-                            
-                    except Exception as e:
-                        print(f"  ERROR: Failed to create symlink for {exe_file.name}: {e}")
-                        error_count += 1
-                
-                print(f"SUMMARY: {success_count} symlinks created, {error_count} errors")
-                
-                # Verify what actually got created
-                print("Verifying /usr/local/bin contents...")
-                usr_local_bin = Path("/usr/local/bin")
-                if usr_local_bin.exists():
-                    bento4_links = [f for f in usr_local_bin.glob("*") if f.is_symlink()]
-                    print(f"Found {len(bento4_links)} symlinks in /usr/local/bin")
-                    for link in bento4_links:
-                        if any(exe.name == link.name for exe in executable_files):
-                            print(f"  VERIFIED: {link.name} -> {link.readlink()}")
-                else:
-                    print("ERROR: /usr/local/bin does not exist")
-            else:
-                print("WARN: Could not find Bento4 extracted folder")
-                
-        else:
-            print("INFO: Bento4 already exists, skipping download")
-            
-            # Ensure Bento4 tools are available even if already downloaded
-            bin_candidates = list(BENTO4_DIR.glob("Bento4*"))
-            if bin_candidates:
-                bin_dir = bin_candidates[0] / "bin"
-                os.environ["PATH"] = f"{bin_dir}:{os.environ['PATH']}"
-                
-                # Check if symbolic links need to be created
-                try:
-                    missing_links = []
-                    for exe_file in bin_dir.glob("*"):
-                        if exe_file.is_file() and os.access(exe_file, os.X_OK):
-                            link_path = Path("/usr/local/bin") / exe_file.name
-                            if not link_path.exists():
-                                missing_links.append((exe_file, link_path))
-                    
-                    if missing_links:
-                        print("Creating missing Bento4 symbolic links...")
-                        for exe_file, link_path in missing_links:
-                            os.symlink(exe_file, link_path)
-                            print(f"  Created symlink: {exe_file.name}")
-                    else:
-                        print("✅ Bento4 tools already available system-wide")
-                        
-                except Exception as e:
-                    print(f"WARN: Could not verify/create symbolic links: {e}")
-                    print(f"Added existing Bento4 bin to current session PATH: {bin_dir}")
-
-        # Step 3: Download and extract wrapper
-        WRAPPER_URL = "https://github.com/WorldObservationLog/wrapper/releases/download/Wrapper.x86_64.0df45b5/Wrapper.x86_64.0df45b5.zip"
-        wrapper_zip = PROJECT_DIR / "wrapper.x86_64.zip"
-
-        if not WRAPPER_DIR.exists():
-            print(f"Downloading wrapper from {WRAPPER_URL}...")
-            urllib.request.urlretrieve(WRAPPER_URL, wrapper_zip)
-            print("Extracting wrapper...")
-
-            WRAPPER_DIR.mkdir(parents=True, exist_ok=True)
-            with zipfile.ZipFile(wrapper_zip, "r") as zip_ref:
-                zip_ref.extractall(WRAPPER_DIR)
-            os.remove(wrapper_zip)
-
-            # Ensure the wrapper binary is executable (running as root, so no sudo needed)
-            wrapper_bin = WRAPPER_DIR / "wrapper"
-            try:
-                if wrapper_bin.exists():
-                    current_mode = wrapper_bin.stat().st_mode
-                    wrapper_bin.chmod(current_mode | 0o755)
-                    print("Set execute permission on wrapper binary")
-                else:
-                    print("WARN: Wrapper binary not found after extraction")
-            except Exception as e:
-                print(f"WARN: Failed to chmod wrapper binary: {e}")
+        # Step 2: Fetch Bento4, the wrapper and Apple Music Downloader concurrently.
+        # Each step owns its own paths, so they are safe to run side by side.
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            list(ex.map(lambda f: f(), [fetch_bento4, fetch_wrapper, clone_amd]))
 
-            print("Wrapper extracted inside project folder")
-        else:
-            print("INFO: Wrapper already exists, skipping download")
-
-        # Step 4: Clone Apple Music Downloader repo
-        if not AMD_DIR.exists():
-            print("Cloning Apple Music Downloader...")
-            subprocess.run(
-                ["git", "clone", "https://github.com/zhaarey/apple-music-downloader", str(AMD_DIR)],
-                check=True
-            )
-            print("Apple Music Downloader cloned inside project folder")
-        else:
-            print("INFO: Apple Music Downloader already exists, skipping clone")
+        # Step 3: Link Bento4 tools serially to avoid races in /usr/local/bin
+        bento4_bin = link_bento4()
 
         print("First setup complete!")
+        return bento4_bin
 
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, urllib.error.URLError, zipfile.BadZipFile, OSError) as e:
         print(f"ERROR: Failed during setup: {e}")
         sys.exit(1)
 
-def start():
+def start(marker_file):
     print("Starting Apple Music Downloader Web UI...")
 
-    # Ensure Bento4 and Wrapper are in PATH locally
-    bin_candidates = list(BENTO4_DIR.glob("Bento4*"))  # find extracted folder
-    if bin_candidates:
-        bin_dir = bin_candidates[0] / "bin"
-        os.environ["PATH"] = f"{bin_dir}:{os.environ['PATH']}"
+    # Ensure Bento4 and Wrapper are in PATH locally, using the paths recorded at setup
+    try:
+        paths = json.loads(marker_file.read_text())
+    except ValueError:
+        # Plain-text marker left by an older setup
+        bento4_bin = find_bento4_bin()
+        paths = {"bento4_bin": bento4_bin and str(bento4_bin), "wrapper_bin": str(WRAPPER_DIR)}
+
+    for key in ("bento4_bin", "wrapper_bin"):
+        if paths.get(key):
+            os.environ["PATH"] = f"{paths[key]}:{os.environ['PATH']}"
 
-    os.environ["PATH"] = f"{WRAPPER_DIR}:{os.environ['PATH']}"
+    # Serve the Flask app with gunicorn when available. The wrapper/download
+    # process handles live in module globals, so this must stay a single worker
+    # process; concurrency comes from its thread pool instead.
+    gunicorn = shutil.which("gunicorn")
+    if gunicorn:
+        os.execv(gunicorn, [
+            "gunicorn", "--chdir", str(PROJECT_DIR),
+            "-w", "1", "-k", "gthread", "--threads", str(max(4, os.cpu_count() or 1)),
+            "-b", "0.0.0.0:5000", "app:app",
+        ])
 
-    # Import and run the Flask app
+    print("WARN: gunicorn not found, falling back to the Flask development server")
     from app import app   # FIXED: no double "app.app"
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, threaded=True)
 
 # === First run check ===
 marker_file = PROJECT_DIR / "firstrun"
 
 if not marker_file.exists():
-    firstsetup()
-    with open(marker_file, "w") as f:
-        f.write("This file marks that first setup has been completed.\n")
+    bento4_bin = firstsetup()
+    # The marker doubles as the record of where setup put the tools
+    marker_file.write_text(json.dumps({
+        "bento4_bin": bento4_bin and str(bento4_bin),
+        "wrapper_bin": str(WRAPPER_DIR),
+    }) + "\n")
 
-start()
+start(marker_file)